@@ -1,18 +1,41 @@
+import asyncio
+import functools
+import hashlib
+import hmac
 import logging
+import mimetypes
 import time
-import random
 import os
+import re
 import subprocess
 import tempfile
 import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
 from pathlib import Path
-from typing import Callable, Optional, List, Tuple
+from xml.etree import ElementTree
+from typing import AsyncIterator, Awaitable, Callable, Literal, Optional, List, Tuple, Union
 
-from fastapi import FastAPI, HTTPException, Request
+import aiohttp
+import numpy as np
+import orjson
+from cachetools import TLRUCache, TTLCache
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import youtube_transcript_api
+from youtube_transcript_api import YouTubeTranscriptApi, CouldNotRetrieveTranscript, TranscriptsDisabled, NoTranscriptFound
 from pydantic import BaseModel
 
+try:
+    import yt_dlp  # type: ignore
+except Exception:  # optional: only the STT fallback needs it
+    yt_dlp = None
+
 # ---------------------------------------
 # Logging
 # ---------------------------------------
@@ -22,7 +45,18 @@ log = logging.getLogger("yt-transcripts")
 # ---------------------------------------
 # FastAPI app
 # ---------------------------------------
-app = FastAPI(title="Transcript API", version="0.3.0")
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Transcripts are thousands of small dicts,
+    where the stdlib encoder dominates request CPU time.
+    (FastAPI ships its own ORJSONResponse, but it is deprecated.)
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(title="Transcript API", version="0.3.0", default_response_class=ORJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],   # tighten for production
@@ -34,14 +68,72 @@ app.add_middleware(
 # Helpers
 # ---------------------------------------
 
-# Simple in-memory caches
-# Success cache: {(videoId, lang, disableTranslate): (timestamp, data)}
+@dataclass
+class SegmentColumns:
+    """
+    Whisper segments stored column-wise (three parallel lists), which is what
+    _normalize_durations works on. Rows are only materialized at the JSON boundary, via to_rows().
+    Caption fetches and Gemini produce rows already and stay rows (see Segments).
+    """
+    texts: List[str] = field(default_factory=list)
+    starts: List[float] = field(default_factory=list)
+    durations: List[float] = field(default_factory=list)
+
+    def append(self, text: str, start: float, duration: float) -> None:
+        self.texts.append(text)
+        self.starts.append(start)
+        self.durations.append(duration)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def to_rows(self) -> List[dict]:
+        return [{"text": t, "start": s, "duration": d} for t, s, d in zip(self.texts, self.starts, self.durations)]
+
+# A transcript as handed to cache_set: Whisper columns, or {text,start,duration} rows
+Segments = Union[SegmentColumns, List[dict]]
+
+
+def _entries_to_rows(data) -> List[dict]:
+    """
+    Copies youtube-transcript-api entries ({text,start,duration} mappings) into response rows
+    in one pass; the rows are serialized as-is by cache_set.
+    """
+    return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+
+
+# Bounded in-memory caches (LRU eviction + TTL expiry). cachetools is not
+# thread-safe, so every access goes through _CACHE_LOCK.
+CACHE_MAXSIZE = 10_000
+_CACHE_LOCK = threading.Lock()
+
+# Success cache: {(videoId, lang, disableTranslate): (json_bytes, etag, rev)}
+# Only the serialized body is kept, so cache hits skip encoding entirely.
 CACHE_TTL_SECONDS = 60 * 30  # 30 minutes
-_CACHE: dict[tuple[str, str, bool], tuple[float, list]] = {}
+_CACHE: TTLCache = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL_SECONDS)
+# Cache generation. Entries remember the rev they were stored under and are ignored once
+# it moves on, so POST /admin/bump-rev invalidates every transcript in O(1).
+CACHE_REV = 0
+
+# Failure cache (circuit breaker): {(videoId, lang, disableTranslate): (set_at, retry_after_seconds, reason)}
+# Each entry expires after its own retry_after; set_at uses the cache's monotonic timer.
+# The cooldown depends on why we failed: throttling clears quickly, a video without
+# captions stays that way, so re-probing it every few minutes only burns upstream quota.
+FailReason = Literal["throttled", "stt_failed", "missing"]
+FAIL_TTL_SECONDS: dict[str, int] = {
+    "throttled": 120,         # upstream error / 429 while fetching captions
+    "stt_failed": 60 * 5,     # no usable captions and the STT fallback failed
+    "missing": 60 * 60 * 24,  # video has no captions and STT was not attempted
+}
+FAIL_TTL_SECONDS_DEFAULT = FAIL_TTL_SECONDS["stt_failed"]
+_FAIL_CACHE: TLRUCache = TLRUCache(maxsize=CACHE_MAXSIZE, ttu=lambda _key, value, now: now + value[1])
 
-# Failure cache (circuit breaker): {(videoId, lang, disableTranslate): (timestamp, retry_after_seconds)}
-FAIL_TTL_SECONDS_DEFAULT = 60 * 5  # 5 minutes cooldown
-_FAIL_CACHE: dict[tuple[str, str, bool], tuple[float, int]] = {}
+# Track listings for /transcript/languages: {videoId: (json_bytes, ttl_seconds)}, stored
+# serialized so hits are returned as-is. Listings change
+# rarely; a video without captions almost never gains them, so empty results live longer.
+LANGS_TTL_SECONDS = 60 * 60            # 1 hour
+LANGS_EMPTY_TTL_SECONDS = 60 * 60 * 24  # 24 hours
+_LANGS_CACHE: TLRUCache = TLRUCache(maxsize=4096, ttu=lambda _key, value, now: now + value[1])
 
 # Mutable env whitelist (server variables allowed to change at runtime)
 ALLOWED_MUTABLE_ENV: set[str] = {
@@ -49,15 +141,57 @@ ALLOWED_MUTABLE_ENV: set[str] = {
     "STT_BACKEND",         # "openai"|"gemini"|"local"
     "GEMINI_MODEL",        # e.g., gemini-1.5-flash
     "GEMINI_SEGMENT_SEC",  # chunk seconds for Gemini splitting
+    "GEMINI_CONCURRENCY",  # max Gemini chunk calls in flight per API key
+    "GEMINI_PIPE_CHUNKS",  # "1" = slice chunks in memory instead of a temp dir
+}
+
+# Snapshot of every env var read on request paths, taken once at startup.
+# /admin/env writes through to both os.environ and this dict, so they stay in sync.
+_ENV_CACHE: dict[str, str] = {
+    k: v
+    for k in ALLOWED_MUTABLE_ENV | {"ADMIN_TOKEN", "OPENAI_API_KEY", "GOOGLE_API_KEY"}
+    if (v := os.environ.get(k)) is not None
 }
 
+def _env(key: str, default: str = "") -> str:
+    return _ENV_CACHE.get(key, default)
+
+@dataclass(frozen=True)
+class SttConfig:
+    """
+    The runtime-mutable STT settings, parsed once instead of on every request.
+    Rebuilt by /admin/env; readers take `_CONFIG` once and get a consistent snapshot.
+    """
+    enable_stt: bool
+    stt_backend: str
+    gemini_model: str
+    gemini_segment_sec: int
+    gemini_concurrency: int
+    gemini_pipe_chunks: bool
+
+    @classmethod
+    def from_env(cls, env: dict[str, str]) -> "SttConfig":
+        """Raises ValueError on a malformed number."""
+        return cls(
+            enable_stt=env.get("ENABLE_STT", "1").strip() != "0",
+            stt_backend=env.get("STT_BACKEND", "openai").strip().lower(),
+            gemini_model=env.get("GEMINI_MODEL", "gemini-1.5-flash"),
+            gemini_segment_sec=max(1, int(env.get("GEMINI_SEGMENT_SEC", "300"))),
+            gemini_concurrency=max(1, int(env.get("GEMINI_CONCURRENCY", "4"))),
+            gemini_pipe_chunks=env.get("GEMINI_PIPE_CHUNKS", "0").strip() == "1",
+        )
+
+_CONFIG = SttConfig.from_env(_ENV_CACHE)
+
+# ADMIN_TOKEN is not runtime-mutable, so encode it once for the constant-time compare
+_ADMIN_TOKEN_BYTES = _env("ADMIN_TOKEN").strip().encode()
+
 def _require_admin(request: Request) -> None:
-    token_header = (request.headers.get("X-Admin-Token", "") or "").strip()
-    token_env = (os.getenv("ADMIN_TOKEN", "") or "").strip()
-    if not token_env:
+    if not _ADMIN_TOKEN_BYTES:
         # If no token configured, deny all mutation for safety
         raise HTTPException(status_code=403, detail="Admin token not configured on server")
-    if token_header != token_env:
+    token = request.headers.get("X-Admin-Token", "").strip().encode()
+    if not hmac.compare_digest(token, _ADMIN_TOKEN_BYTES):
         raise HTTPException(status_code=403, detail="Forbidden: invalid admin token")
 
 
@@ -67,7 +201,7 @@ class EnvSetPayload(BaseModel):
 
 
 @app.get("/admin/env")
-def admin_env_get(request: Request, key: str):
+async def admin_env_get(request: Request, key: str):
     """
     Read current value of a whitelisted env var.
     Secured via X-Admin-Token header.
@@ -76,55 +210,97 @@ def admin_env_get(request: Request, key: str):
     k = (key or "").strip().upper()
     if k not in ALLOWED_MUTABLE_ENV:
         raise HTTPException(status_code=400, detail="Key not allowed")
-    return {"key": k, "value": os.getenv(k)}
+    return {"key": k, "value": _ENV_CACHE.get(k)}
 
 
 @app.post("/admin/env")
-def admin_env_set(request: Request, payload: EnvSetPayload):
+async def admin_env_set(request: Request, payload: EnvSetPayload):
     """
     Set or unset a whitelisted env var at runtime.
     - If value is None or empty => unset (delete) the variable.
     """
     _require_admin(request)
+    global _CONFIG
     k = (payload.key or "").strip().upper()
     if k not in ALLOWED_MUTABLE_ENV:
         raise HTTPException(status_code=400, detail="Key not allowed")
     v = None if (payload.value is None or str(payload.value).strip() == "") else str(payload.value)
+    # Parse before applying so a bad number can't leave the server half-configured
+    candidate = {**_ENV_CACHE, k: v} if v is not None else {kk: vv for kk, vv in _ENV_CACHE.items() if kk != k}
+    try:
+        _CONFIG = SttConfig.from_env(candidate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid value for {k}: {e}")
     if v is None:
         os.environ.pop(k, None)
+        _ENV_CACHE.pop(k, None)
         log.info(f"[admin] UNSET {k}")
     else:
         os.environ[k] = v
+        _ENV_CACHE[k] = v
         log.info(f"[admin] SET {k}='{v}'")
-    return {"status": "ok", "key": k, "value": os.getenv(k)}
+    return {"status": "ok", "key": k, "value": _ENV_CACHE.get(k)}
 
-def cache_get(video_id: str, lang: str, disable_translate: bool) -> Optional[list]:
+@app.get("/admin/cache/stats")
+async def admin_cache_stats(request: Request):
+    """
+    Sizes of the in-memory transcript and failure caches.
+    Secured via X-Admin-Token header.
+    """
+    _require_admin(request)
+    return {"cache": _cache_stats(_CACHE), "fail_cache": _cache_stats(_FAIL_CACHE), "languages_cache": _cache_stats(_LANGS_CACHE)}
+
+@app.post("/admin/bump-rev")
+async def admin_bump_rev(request: Request):
+    """
+    Invalidate every cached transcript at once (e.g. after changing the fetch/translate pipeline).
+    Old entries are dropped lazily on their next lookup or at TTL expiry.
+    Secured via X-Admin-Token header.
+    """
+    _require_admin(request)
+    global CACHE_REV
+    with _CACHE_LOCK:
+        CACHE_REV += 1
+        rev = CACHE_REV
+    log.info(f"[admin] cache rev bumped to {rev}")
+    return {"status": "ok", "rev": rev}
+
+def cache_get(video_id: str, lang: str, disable_translate: bool) -> Optional[Tuple[bytes, str]]:
+    """
+    Returns (json_bytes, etag) for a fresh entry, or None.
+    """
     key = (video_id, lang, bool(disable_translate))
-    entry = _CACHE.get(key)
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry and entry[2] != CACHE_REV:
+            # From an older generation: drop it now rather than at TTL expiry
+            del _CACHE[key]
+            entry = None
     if not entry:
         return None
-    ts, data = entry
-    if (time.time() - ts) > CACHE_TTL_SECONDS:
-        _CACHE.pop(key, None)
-        return None
-    return data
+    body, etag, _rev = entry
+    return body, etag
 
 
-@app.get("/health/stt")
-def stt_health():
+@app.get("/health/stt", response_model=None, response_class=ORJSONResponse)
+async def stt_health():
     """
     Lightweight readiness probe for STT pipeline.
     Returns flags for env keys, selected backend, model, and external tools.
     """
-    enable_env = os.getenv("ENABLE_STT", "1").strip() != "0"
-    backend = os.getenv("STT_BACKEND", "openai").strip().lower()
-    gem_model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-    has_google_key = bool(os.getenv("GOOGLE_API_KEY"))
+    # PATH scans and the optional SDK import block; keep them off the event loop
+    return ORJSONResponse(content=await run_in_threadpool(_stt_health_report))
+
+def _stt_health_report() -> dict:
+    cfg = _CONFIG
+    enable_env = cfg.enable_stt
+    backend = cfg.stt_backend
+    gem_model = cfg.gemini_model
+    has_google_key = bool(_env("GOOGLE_API_KEY"))
     # Tooling
     tools = {
-        "yt_dlp": _has_cmd("yt-dlp"),
+        "yt_dlp": yt_dlp is not None,
         "ffmpeg": _has_cmd("ffmpeg"),
-        "ffprobe": _has_cmd("ffprobe"),
     }
     # Module presence
     gem_pkg = False
@@ -146,26 +322,66 @@ def stt_health():
         "status": "ready" if enable_env and (backend in ["gemini", "openai", "local"]) else "disabled",
     }
 
-def cache_set(video_id: str, lang: str, disable_translate: bool, data: list) -> None:
+def cache_set(video_id: str, lang: str, disable_translate: bool, data: Segments) -> Tuple[bytes, str]:
+    """
+    Serializes data once and stores it. Returns (json_bytes, etag) for the response.
+    """
     key = (video_id, lang, bool(disable_translate))
-    _CACHE[key] = (time.time(), data)
+    body = orjson.dumps(data.to_rows() if isinstance(data, SegmentColumns) else data)
+    etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+    with _CACHE_LOCK:
+        _CACHE[key] = (body, etag, CACHE_REV)
+    return body, etag
 
-def fail_cache_get(video_id: str, lang: str, disable_translate: bool) -> Optional[int]:
+def _json_bytes_response(request: Request, body: bytes, etag: str, media_type: str = "application/json") -> Response:
+    """
+    Sends pre-serialized JSON, answering 304 when the client already holds this ETag.
+    """
+    headers = {"ETag": etag, "Cache-Control": f"max-age={CACHE_TTL_SECONDS}"}
+    inm = request.headers.get("If-None-Match")
+    if inm and (inm.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in inm.split(","))):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def fail_cache_get(video_id: str, lang: str, disable_translate: bool) -> Optional[Tuple[int, FailReason]]:
+    """Returns (remaining seconds, reason) while a cooldown is active, else None."""
     key = (video_id, lang, bool(disable_translate))
-    entry = _FAIL_CACHE.get(key)
+    with _CACHE_LOCK:
+        entry = _FAIL_CACHE.get(key)
+        now = _FAIL_CACHE.timer()
     if not entry:
         return None
-    ts, retry_sec = entry
-    if (time.time() - ts) > retry_sec:
-        _FAIL_CACHE.pop(key, None)
-        return None
+    set_at, retry_sec, reason = entry
     # remaining time (rounded)
-    remaining = max(1, int(retry_sec - (time.time() - ts)))
-    return remaining
+    remaining = max(1, int(retry_sec - (now - set_at)))
+    return remaining, reason
 
-def fail_cache_set(video_id: str, lang: str, disable_translate: bool, retry_after_seconds: Optional[int] = None) -> None:
+def fail_cache_set(video_id: str, lang: str, disable_translate: bool, reason: FailReason = "stt_failed", retry_after_seconds: Optional[int] = None) -> dict[str, str]:
+    """Starts a cooldown (default length per reason) and returns the Retry-After headers for the 429."""
     key = (video_id, lang, bool(disable_translate))
-    _FAIL_CACHE[key] = (time.time(), int(retry_after_seconds or FAIL_TTL_SECONDS_DEFAULT))
+    retry_sec = int(retry_after_seconds or FAIL_TTL_SECONDS.get(reason, FAIL_TTL_SECONDS_DEFAULT))
+    with _CACHE_LOCK:
+        _FAIL_CACHE[key] = (_FAIL_CACHE.timer(), retry_sec, reason)
+    return {"Retry-After": str(retry_sec)}
+
+def _cache_stats(cache, sample: int = 32) -> dict:
+    """
+    Size summary for an admin view. Memory is extrapolated from sys.getsizeof
+    over a small sample of values (bytes bodies dominate for _CACHE).
+    """
+    with _CACHE_LOCK:
+        cache.expire()
+        n = len(cache)
+        values = list(islice(cache.values(), sample))
+    per_entry = 0
+    if values:
+        per_entry = sum(sum(sys.getsizeof(part) for part in v) for v in values) // len(values)
+    return {
+        "len": n,
+        "currsize": cache.currsize,
+        "maxsize": cache.maxsize,
+        "approx_bytes": per_entry * n,
+    }
 
 def _safe_float(val, default: float = 0.0) -> float:
     try:
@@ -173,213 +389,489 @@ def _safe_float(val, default: float = 0.0) -> float:
     except Exception:
         return default
 
-def _normalize_durations(segments: List[dict]) -> List[dict]:
+def _normalize_durations(segments: Optional[SegmentColumns]) -> Optional[SegmentColumns]:
     """
     Ensure each segment has a positive duration. If duration is missing or <= 0,
     infer it from the next segment's start time. For the last segment, reuse the
     previous delta as a best-effort estimate.
+    Works in place on the columns: the start-time deltas for all segments come
+    from one NumPy pass, and only the <= 0 check stays a Python loop.
     """
     if not segments:
         return segments
-    normalized: List[dict] = []
     n = len(segments)
-    for i, seg in enumerate(segments):
-        start = _safe_float(seg.get("start", 0.0), 0.0)
-        dur = seg.get("duration", 0.0)
-        needs_fill = False
+    starts = np.fromiter((_safe_float(v, 0.0) for v in segments.starts), dtype=np.float64, count=n)
+    fills = np.zeros(n, dtype=np.float64)
+    if n >= 2:
+        gaps = np.clip(np.round(np.diff(starts), 3), 0.0, None)
+        fills[:-1] = gaps
+        # Last segment: approximate using previous delta
+        fills[-1] = gaps[-1]
+    # tolist() hands back Python floats, which the JSON encoder accepts as-is
+    segments.starts = starts.tolist()
+    durations = segments.durations
+    for i, filled in enumerate(fills.tolist()):
         try:
-            needs_fill = float(dur) <= 0
+            needs_fill = float(durations[i]) <= 0
         except Exception:
             needs_fill = True
-
         if needs_fill:
-            if i < n - 1:
-                next_start = _safe_float(segments[i + 1].get("start", start), start)
-                filled = max(0.0, round(next_start - start, 3))
-            else:
-                # Last segment: approximate using previous delta if available
-                if n >= 2:
-                    prev_start = _safe_float(segments[i - 1].get("start", start), start)
-                    filled = max(0.0, round(start - prev_start, 3))
-                else:
-                    filled = 0.0
-            dur = filled
-
-        new_seg = dict(seg)
-        new_seg["start"] = start
-        new_seg["duration"] = dur
-        normalized.append(new_seg)
-    return normalized
+            durations[i] = filled
+    return segments
 
 # Optional STT helpers (OpenAI Whisper, Gemini, Local)
 # ---------------------------------------
 
+# Blocking STT work (yt-dlp downloads, ffmpeg pipe reads/waits, Gemini SDK calls) runs on its
+# own bounded pool. Request-path blocking calls (caption fetches, listings) use Starlette's
+# anyio threadpool via run_in_threadpool instead, so a long STT job never queues them behind it.
+STT_THREADS = max(1, int(os.getenv("STT_THREADS", "16")))
+_STT_EXECUTOR = ThreadPoolExecutor(max_workers=STT_THREADS, thread_name_prefix="stt")
+
+async def _run_stt_blocking(func: Callable, *args):
+    return await asyncio.get_running_loop().run_in_executor(_STT_EXECUTOR, functools.partial(func, *args))
+
+@app.on_event("shutdown")
+def _shutdown_stt_executor() -> None:
+    _STT_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+
+@functools.lru_cache(maxsize=16)
 def _has_cmd(cmd: str) -> bool:
+    # shutil.which stats every PATH entry. No /admin/env key can change PATH,
+    # so the answer holds for the process lifetime; call _has_cmd.cache_clear() if one ever does.
     return shutil.which(cmd) is not None
 
+class _AudioScratchRegistry:
+    """
+    Scratch dirs currently holding downloaded/split audio. Dirs are added when created and
+    dropped by _fast_rmtree; new STT runs are refused while their combined size is over quota,
+    so concurrent long videos (or cleanup lagging behind) can't fill the disk.
+    """
+
+    def __init__(self, quota_bytes: int):
+        self.quota_bytes = quota_bytes  # 0 disables the check
+        self._dirs: set[Path] = set()
+        self._lock = threading.Lock()  # dirs are created on worker threads
+
+    def add(self, path: Path) -> None:
+        with self._lock:
+            self._dirs.add(path)
+
+    def discard(self, path: Path) -> None:
+        with self._lock:
+            self._dirs.discard(path)
+
+    def usage_bytes(self) -> int:
+        with self._lock:
+            dirs = list(self._dirs)
+        total = 0
+        for d in dirs:
+            try:
+                with os.scandir(d) as it:
+                    total += sum(e.stat(follow_symlinks=False).st_size for e in it if e.is_file(follow_symlinks=False))
+            except OSError:
+                pass  # removed while we were scanning
+        return total
+
+    def over_quota(self) -> bool:
+        return self.quota_bytes > 0 and self.usage_bytes() >= self.quota_bytes
+
+AUDIO_DISK_QUOTA_MB = int(os.getenv("AUDIO_DISK_QUOTA_MB", "2048"))
+AUDIO_QUOTA_RETRY_SECONDS = 30
+_AUDIO_SCRATCH = _AudioScratchRegistry(AUDIO_DISK_QUOTA_MB * 1024 * 1024)
+
+def _check_audio_quota() -> None:
+    if _AUDIO_SCRATCH.over_quota():
+        log.info(f"[stt] audio scratch over {AUDIO_DISK_QUOTA_MB} MB; refusing new STT run")
+        raise HTTPException(status_code=503, detail="STT is busy (audio scratch space full). Please retry later.",
+                            headers={"Retry-After": str(AUDIO_QUOTA_RETRY_SECONDS)})
+
+def _fast_rmtree(path: Path) -> None:
+    """
+    Removes one of our scratch dirs. They are flat (audio file, audio parts, ffmpeg log), so a
+    single scandir pass with unlink + rmdir is enough; anything unexpected (a subdir, a
+    permission error) falls back to shutil.rmtree. Never raises.
+    Spawning `rm -rf` would cost more than it saves for the handful of files we leave.
+    """
+    _AUDIO_SCRATCH.discard(path)
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    raise IsADirectoryError(entry.path)
+                os.unlink(entry.path)
+        os.rmdir(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+
+async def _remove_dirs_now(dirs: set[Path]) -> None:
+    # For error responses: HTTPException discards the request's BackgroundTasks.
+    for d in dirs:
+        await run_in_threadpool(_fast_rmtree, d)
+
+# yt-dlp runs in-process: its extractors are imported once per process instead of
+# paying interpreter startup + extractor registry init on every STT request.
+# YoutubeDL instances carry per-download state, so each call builds its own (cheap once imported).
+_YDL_PARAMS = {
+    "format": "bestaudio/best",
+    "noplaylist": True,
+    "quiet": True,
+    "no_warnings": True,
+    "noprogress": True,
+}
+
 def _download_audio_tmp(video_id: str) -> Optional[Path]:
     """
     Downloads audio-only for the given videoId using yt-dlp into a temp folder.
     Returns the Path to the downloaded file, or None on failure.
     """
-    if not _has_cmd("yt-dlp"):
-        log.debug("[stt] yt-dlp not found in PATH; skipping STT")
+    if yt_dlp is None:
+        log.debug("[stt] yt_dlp package not available; skipping STT")
         return None
     tmpdir = Path(tempfile.mkdtemp(prefix="yt_stt_"))
+    _AUDIO_SCRATCH.add(tmpdir)
     # Output template without extension; yt-dlp will pick suitable extension
-    out_tmpl = str(tmpdir / "audio.%(ext)s")
+    params = {**_YDL_PARAMS, "outtmpl": str(tmpdir / "audio.%(ext)s")}
     url = f"https://www.youtube.com/watch?v={video_id}"
-    cmd = [
-        "yt-dlp",
-        "-f", "bestaudio/best",
-        "--no-playlist",
-        "-o", out_tmpl,
-        url,
-    ]
     try:
-        log.debug(f"[stt] running: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        log.debug(f"[stt] yt-dlp download {url}")
+        with yt_dlp.YoutubeDL(params) as ydl:
+            ydl.download([url])
     except Exception as e:
         log.debug(f"[stt] yt-dlp failed: {e}")
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        _fast_rmtree(tmpdir)
         return None
     # Find resulting file
     files = list(tmpdir.glob("audio.*"))
     if not files:
-        shutil.rmtree(tmpdir, ignore_errors=True)
+        _fast_rmtree(tmpdir)
         return None
     return files[0]
 
-def _whisper_transcribe_segments(audio_path: Path, lang: str) -> Optional[List[dict]]:
+# Formats fed to ffmpeg through a pipe (see _spawn_ffmpeg) must be plain http(s) downloads:
+# yt-dlp writes fragmented ones (HLS, DASH segments) through fragment files next to the output.
+_STREAM_YDL_PARAMS = {**_YDL_PARAMS, "format": "bestaudio[protocol~='^https?$']/best[protocol~='^https?$']"}
+# Writing into a pipe: no .part file to rename, no resume, no mtime to set
+_FEED_YDL_PARAMS = {**_YDL_PARAMS, "nopart": True, "continuedl": False, "updatetime": False}
+
+def _resolve_audio_stream(video_id: str) -> Optional[dict]:
     """
-    Uses OpenAI Whisper API to transcribe the audio file. Returns list of {text,start,duration}.
-    Requires OPENAI_API_KEY. Falls back gracefully if package or key missing.
+    Picks the best progressive (http/https) audio format with yt-dlp without downloading it.
+    Returns the format's info dict (url, http_headers, acodec, downloader_options, ...), or None on failure.
+    """
+    if yt_dlp is None:
+        log.debug("[stt] yt_dlp package not available; skipping STT")
+        return None
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    try:
+        with yt_dlp.YoutubeDL(_STREAM_YDL_PARAMS) as ydl:
+            info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        log.debug(f"[stt] yt-dlp extract failed: {e}")
+        return None
+    if not info or not info.get("url") or info.get("protocol") not in ("http", "https"):
+        log.debug("[stt] yt-dlp returned no progressive audio stream")
+        return None
+    return info
+
+OPENAI_TRANSCRIPTIONS_URL = "https://api.openai.com/v1/audio/transcriptions"
+
+# One shared aiohttp session per process (connection pooling); created lazily on the running loop.
+_HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+
+def _http_session() -> aiohttp.ClientSession:
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None or _HTTP_SESSION.closed:
+        # Large audio uploads: bound connect/read stalls, not total transfer time
+        _HTTP_SESSION = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=600))
+    return _HTTP_SESSION
+
+@app.on_event("shutdown")
+async def _close_http_session() -> None:
+    if _HTTP_SESSION is not None and not _HTTP_SESSION.closed:
+        await _HTTP_SESSION.close()
+
+async def _whisper_transcribe_segments(audio_path: Path, lang: str) -> Optional[SegmentColumns]:
     """
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    Uses OpenAI Whisper API to transcribe the audio file. Returns SegmentColumns.
+    Requires OPENAI_API_KEY. The file is streamed as a multipart upload straight from
+    disk (aiohttp reads it in chunks), so it is never held in memory whole.
+    """
+    api_key = _env("OPENAI_API_KEY").strip()
     if not api_key:
         log.debug("[stt] OPENAI_API_KEY not set; skipping STT")
         return None
+    form = aiohttp.FormData()
+    form.add_field("model", "whisper-1")
+    form.add_field("language", lang if lang else "en")
+    # Request verbose JSON to get segments with timestamps
+    form.add_field("response_format", "verbose_json")
     try:
-        # Try new SDK style first
-        from openai import OpenAI  # type: ignore
-        client = OpenAI()
-        # Request verbose JSON to get segments with timestamps if supported
         with open(audio_path, "rb") as f:
-            try:
-                resp = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=f,
-                    language=(lang if lang else "en"),
-                    response_format="verbose_json",
-                )
-                segments = getattr(resp, "segments", None)
-                if not segments:
-                    # Fallback: no segments, return a single chunk without timestamps
-                    text = getattr(resp, "text", "") or ""
-                    if not text.strip():
-                        return None
-                    return [{"text": text, "start": 0.0, "duration": 0.0}]
-                out = []
-                for s in segments:
-                    start = float(getattr(s, "start", 0.0))
-                    end = float(getattr(s, "end", start))
-                    out.append({
-                        "text": getattr(s, "text", ""),
-                        "start": start,
-                        "duration": max(0.0, end - start),
-                    })
-                return out
-            except Exception as e1:
-                log.debug(f"[stt] OpenAI new SDK path failed: {e1}")
-                return None
-    except Exception:
-        # Try legacy SDK import
-        try:
-            import openai  # type: ignore
-            openai.api_key = api_key
-            with open(audio_path, "rb") as f:
-                try:
-                    resp = openai.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=f,
-                        language=(lang if lang else "en"),
-                        response_format="verbose_json",
-                    )
-                    segments = resp.get("segments") if isinstance(resp, dict) else getattr(resp, "segments", None)
-                    if not segments:
-                        text = (resp.get("text") if isinstance(resp, dict) else getattr(resp, "text", "")) or ""
-                        if not text.strip():
-                            return None
-                        return [{"text": text, "start": 0.0, "duration": 0.0}]
-                    out = []
-                    for s in segments:
-                        start = float(s.get("start", 0.0))
-                        end = float(s.get("end", start))
-                        out.append({
-                            "text": s.get("text", ""),
-                            "start": start,
-                            "duration": max(0.0, end - start),
-                        })
-                    return out
-                except Exception as e2:
-                    log.debug(f"[stt] OpenAI legacy SDK path failed: {e2}")
+            form.add_field(
+                "file", f,
+                filename=audio_path.name,
+                content_type=mimetypes.guess_type(audio_path.name)[0] or "application/octet-stream",
+            )
+            headers = {"Authorization": f"Bearer {api_key}"}
+            async with _http_session().post(OPENAI_TRANSCRIPTIONS_URL, data=form, headers=headers) as resp:
+                body = await resp.read()
+                if resp.status != 200:
+                    log.debug(f"[stt] Whisper API returned {resp.status}: {body[:300]!r}")
                     return None
-        except Exception as e0:
-            log.debug(f"[stt] openai package not available: {e0}")
-            return None
+        payload = orjson.loads(body)
+    except Exception as e:
+        log.debug(f"[stt] Whisper API request failed: {e}")
+        return None
+    try:
+        segments = payload.get("segments")
+        if not segments:
+            # Fallback: no segments, return a single chunk without timestamps
+            text = payload.get("text") or ""
+            if not text.strip():
+                return None
+            return SegmentColumns([text], [0.0], [0.0])
+        out = SegmentColumns()
+        for s in segments:
+            start = float(s.get("start", 0.0))
+            end = float(s.get("end", start))
+            out.append(s.get("text", ""), start, max(0.0, end - start))
+    except (AttributeError, TypeError, ValueError) as e:
+        # 200 with a body that isn't the verbose_json shape (non-object, null/str timestamps)
+        log.debug(f"[stt] unexpected Whisper response: {e}")
+        return None
+    return out
 
-def _stt_fallback(video_id: str, lang: str) -> Optional[List[dict]]:
+async def _stt_fallback(video_id: str, lang: str, cleanup_dirs: Optional[set[Path]] = None) -> Optional[SegmentColumns]:
     """
     Full STT fallback pipeline: download audio via yt-dlp and transcribe via Whisper API.
-    Cleans up temp files. Returns segments or None.
+    Cleans up temp files, or leaves that to the caller by adding the dir to cleanup_dirs.
+    Returns segments or None.
     """
-    audio = _download_audio_tmp(video_id)
+    audio = await _run_stt_blocking(_download_audio_tmp, video_id)
     if not audio:
         return None
+    scratch_dir = audio.parent
+    if cleanup_dirs is not None:
+        cleanup_dirs.add(scratch_dir)
     try:
-        segs = _whisper_transcribe_segments(audio, lang)
+        segs = await _whisper_transcribe_segments(audio, lang)
         return _normalize_durations(segs)
     finally:
-        try:
-            shutil.rmtree(audio.parent, ignore_errors=True)
-        except Exception:
-            pass
+        if cleanup_dirs is None:
+            _fast_rmtree(scratch_dir)
 
 # ------------------------------
 # Gemini backend (chunked)
 # ------------------------------
 
-def _split_audio_ffmpeg(input_path: Path, segment_seconds: int = 300) -> List[Path]:
+_FFMPEG_LOG = "ffmpeg.log"
+
+# Source codecs whose packets can be cut into chunks without re-encoding:
+# acodec prefix -> (segment muxer, chunk extension). All are formats Gemini accepts.
+_COPY_SEGMENT_FORMATS = {
+    "opus": ("ogg", "ogg"),
+    "mp4a": ("adts", "aac"),
+    "mp3": ("mp3", "mp3"),
+}
+
+# ffmpeg reads the audio from stdin; yt-dlp's downloader writes it there (see _spawn_ffmpeg)
+_FFMPEG_INPUT_ARGS = ["ffmpeg", "-y", "-nostats", "-loglevel", "error", "-i", "pipe:0", "-vn"]
+
+def _read_tail(f, limit: int = 512) -> str:
+    # Last `limit` bytes of a binary file object (ffmpeg's error output), decoded
+    try:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - limit))
+        return f.read().decode("utf-8", "replace").strip()
+    except (OSError, ValueError):
+        return ""
+
+def _feed_ffmpeg(proc: subprocess.Popen, info: dict) -> None:
     """
-    Split audio into ~segment_seconds chunks using ffmpeg. Returns list of chunk Paths.
-    Requires ffmpeg in PATH. Falls back to single file if ffmpeg missing or fails.
+    Downloads the resolved stream into ffmpeg's stdin with yt-dlp's own downloader, so YouTube
+    gets the Range requests of downloader_options.http_chunk_size it serves at full speed
+    (one unbounded request is throttled to about realtime) plus yt-dlp's retries.
+    A failed download kills ffmpeg, so it shows up as a non-zero exit rather than as a
+    complete-looking transcript of truncated audio. Blocking; runs on its own thread.
+    """
+    ok = False
+    try:
+        with yt_dlp.YoutubeDL(_FEED_YDL_PARAMS) as ydl:
+            # A path, not the file object: yt-dlp opens its output by name (FIFOs are supported)
+            ok, _ = ydl.dl(f"/dev/fd/{proc.stdin.fileno()}", info)
+    except Exception as e:
+        log.debug(f"[gemini] yt-dlp download failed: {e}")
+    if not ok and proc.poll() is None:
+        proc.kill()
+    proc.stdin.close()
+
+def _spawn_ffmpeg(cmd: List[str], info: dict, stdout=subprocess.DEVNULL, stderr=None) -> subprocess.Popen:
+    """
+    Starts ffmpeg reading stdin and a thread that downloads info's stream into it.
+    """
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=stdout, stderr=stderr)
+    threading.Thread(target=_feed_ffmpeg, args=(proc, info), name="stt-feed", daemon=True).start()
+    return proc
+
+def _spawn_segmenter(cmd: List[str], out_dir: Path, info: dict) -> subprocess.Popen:
+    # stderr goes straight to a file (no pipe for us to drain); with -loglevel error
+    # it only holds actual errors, which _iter_finished_parts reports on failure.
+    with open(out_dir / _FFMPEG_LOG, "wb") as err:
+        return _spawn_ffmpeg(cmd, info, stderr=err)
+
+def _start_audio_segmenter(video_id: str, segment_seconds: int = 300) -> Optional[Tuple[Path, List[subprocess.Popen], Optional[Callable[[], subprocess.Popen]]]]:
+    """
+    Resolves the audio stream with the in-process yt-dlp, then starts one ffmpeg that reads
+    it from yt-dlp's downloader and cuts it into ~segment_seconds chunks (part_000.<ext>, ...)
+    in a temp folder. The audio is never written to disk whole.
+    Opus/AAC/MP3 sources are stream-copied into the chunks (no decode/encode, Gemini decodes
+    anyway); anything else is re-encoded to mono 16 kHz mp3. Blocking (stream resolution hits the network).
+    Returns (out_dir, processes, reencode) without waiting for ffmpeg, or None.
+    reencode() restarts download and split re-encoding, for when the stream copy fails
+    (None when already re-encoding).
     """
     if not _has_cmd("ffmpeg"):
-        log.debug("[gemini] ffmpeg not found; using single-file transcription")
-        return [input_path]
+        log.debug("[gemini] ffmpeg not found in PATH; skipping STT")
+        return None
+    info = _resolve_audio_stream(video_id)
+    if not info:
+        return None
     out_dir = Path(tempfile.mkdtemp(prefix="yt_stt_seg_"))
-    out_pattern = str(out_dir / "part_%03d.mp3")
+    _AUDIO_SCRATCH.add(out_dir)
+    input_args = _FFMPEG_INPUT_ARGS
+    segment_args = ["-segment_time", str(segment_seconds), "-reset_timestamps", "1"]
+    reencode_cmd = [
+        *input_args, "-acodec", "libmp3lame", "-ar", "16000", "-ac", "1",
+        "-f", "segment", *segment_args, str(out_dir / "part_%03d.mp3"),
+    ]
+    acodec = (info.get("acodec") or "").split(".")[0].lower()
+    copy_format = _COPY_SEGMENT_FORMATS.get(acodec)
+    if copy_format:
+        muxer, ext = copy_format
+        cmd = [
+            *input_args, "-c:a", "copy",
+            "-f", "segment", "-segment_format", muxer, *segment_args, str(out_dir / f"part_%03d.{ext}"),
+        ]
+    else:
+        cmd, reencode_cmd = reencode_cmd, None
+    try:
+        log.debug(f"[gemini] segmenting format={info.get('format_id')} acodec={info.get('acodec')} "
+                  f"({'stream copy' if reencode_cmd else 're-encode'}) into {out_dir}")
+        procs = [_spawn_segmenter(cmd, out_dir, info)]
+    except Exception as e:
+        log.debug(f"[gemini] could not start ffmpeg: {e}")
+        _fast_rmtree(out_dir)
+        return None
+    reencode = functools.partial(_spawn_segmenter, reencode_cmd, out_dir, info) if reencode_cmd else None
+    return out_dir, procs, reencode
+
+# GEMINI_PIPE_CHUNKS=1: ffmpeg encodes constant-bitrate mp3 to stdout and chunks are sliced
+# from the pipe in memory, so nothing touches disk. At 16 kHz mono 32 kb/s every MPEG-2
+# layer III frame is exactly 144 bytes / 576 samples (36 ms), so a chunk is a whole number of
+# frames and its start time is exact. Costs ~4 KB of RAM per second of audio in flight.
+_PIPE_SAMPLE_RATE = 16000
+_PIPE_BITRATE = 32000
+_MP3_FRAME_SAMPLES = 576
+_MP3_FRAME_BYTES = 72 * _PIPE_BITRATE // _PIPE_SAMPLE_RATE
+
+def _start_audio_pipe(video_id: str):
+    """
+    Resolves the audio stream and starts ffmpeg writing raw CBR mp3 frames to its stdout.
+    stderr goes to an anonymous temp file (already unlinked, nothing to clean up).
+    Blocking. Returns (process, stderr_file) or None.
+    """
+    if not _has_cmd("ffmpeg"):
+        log.debug("[gemini] ffmpeg not found in PATH; skipping STT")
+        return None
+    info = _resolve_audio_stream(video_id)
+    if not info:
+        return None
     cmd = [
-        "ffmpeg", "-y", "-i", str(input_path),
-        "-vn", "-acodec", "libmp3lame", "-ar", "16000", "-ac", "1",
-        "-f", "segment", "-segment_time", str(segment_seconds), out_pattern,
+        *_FFMPEG_INPUT_ARGS,
+        "-acodec", "libmp3lame", "-ar", str(_PIPE_SAMPLE_RATE), "-ac", "1", "-b:a", str(_PIPE_BITRATE),
+        "-write_xing", "0", "-id3v2_version", "0", "-f", "mp3", "pipe:1",
     ]
+    err = tempfile.TemporaryFile()
     try:
-        log.debug(f"[gemini] splitting with ffmpeg: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        parts = sorted(out_dir.glob("part_*.mp3"))
-        return parts if parts else [input_path]
+        log.debug(f"[gemini] piping format={info.get('format_id')} acodec={info.get('acodec')} as mp3")
+        proc = _spawn_ffmpeg(cmd, info, stdout=subprocess.PIPE, stderr=err)
     except Exception as e:
-        log.debug(f"[gemini] ffmpeg split failed: {e}")
-        shutil.rmtree(out_dir, ignore_errors=True)
-        return [input_path]
+        log.debug(f"[gemini] could not start ffmpeg: {e}")
+        err.close()
+        return None
+    return proc, err
+
+async def _iter_piped_chunks(proc: subprocess.Popen, err, chunk_bytes: int) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Yields (index, mp3 bytes) chunks of chunk_bytes read from ffmpeg's stdout as they fill up.
+    Raises RuntimeError (with the tail of ffmpeg's error output) if ffmpeg exits non-zero.
+    """
+    idx = 0
+    while data := await _run_stt_blocking(proc.stdout.read, chunk_bytes):
+        yield idx, data
+        idx += 1
+    code = await _run_stt_blocking(proc.wait)
+    if code:
+        raise RuntimeError(f"download/encode exit code={code} {_read_tail(err)}".rstrip())
+
+def _stop_processes(procs: List[subprocess.Popen]) -> None:
+    for p in procs:
+        if p.poll() is None:
+            p.kill()
+            p.wait()
+        if p.stdout:
+            p.stdout.close()
+
+async def _iter_finished_parts(out_dir: Path, procs: List[subprocess.Popen], poll_seconds: float = 0.5) -> AsyncIterator[Tuple[int, Path]]:
+    """
+    Yields (index, path) for each chunk as soon as ffmpeg has finished writing it.
+    The segment muxer only opens part N+1 after closing part N, so while the pipeline
+    runs every part except the newest is complete; after a failed exit the newest is
+    treated as truncated and not yielded.
+    Raises RuntimeError (with the tail of ffmpeg's error output) if the pipeline exits non-zero.
+    """
+    emitted = 0
+    while True:
+        running = any(p.poll() is None for p in procs)
+        parts = sorted(out_dir.glob("part_*"))
+        ready = parts if not running and not any(p.returncode for p in procs) else parts[:-1]
+        for path in ready[emitted:]:
+            yield emitted, path
+            emitted += 1
+        if not running:
+            break
+        await asyncio.sleep(poll_seconds)
+    codes = [p.returncode for p in procs]
+    if any(codes):
+        try:
+            with open(out_dir / _FFMPEG_LOG, "rb") as f:
+                tail = _read_tail(f)
+        except OSError:
+            tail = ""
+        raise RuntimeError(f"download/split exit codes={codes} {tail}".rstrip())
+
+@functools.lru_cache(maxsize=64)
+def _gemini_clients(api_key: str):
+    """
+    (file client, generative client) bound to one API key. genai.configure() is process-global
+    and the SDK picks its default clients up lazily, so with overlapping pipelines every call
+    would use whichever key was configured last, and be counted against the other key's slots
+    (see _gemini_slots). The clients are thread-safe and reused; bounded since header keys are arbitrary.
+    """
+    from google.generativeai import client as genai_client  # type: ignore
+    manager = genai_client._ClientManager()
+    manager.configure(api_key=api_key)
+    return manager.get_default_client("file"), manager.get_default_client("generative")
 
-def _gemini_transcribe_files(paths: List[Path], lang: str, api_key_override: Optional[str] = None) -> Optional[List[dict]]:
+def _gemini_model(api_key_override: Optional[str] = None):
     """
-    Transcribe a list of audio files using Gemini API. Requires GOOGLE_API_KEY and google-generativeai.
-    Produces a flat list of {text,start,duration} with approximate timestamps by concatenating chunk offsets.
+    Returns (file client, model) for the request's API key, or None when the key or package is missing.
+    Leaves google-generativeai's global configuration alone (see _gemini_clients).
     """
-    api_key = (api_key_override or os.getenv("GOOGLE_API_KEY", "")).strip()
+    api_key = (api_key_override or _env("GOOGLE_API_KEY")).strip()
     if not api_key:
         log.debug("[gemini] GOOGLE_API_KEY not set; skipping Gemini STT")
         return None
@@ -389,57 +881,268 @@ def _gemini_transcribe_files(paths: List[Path], lang: str, api_key_override: Opt
         log.debug(f"[gemini] google-generativeai not available: {e}")
         return None
     try:
-        genai.configure(api_key=api_key)
-        model_name = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
-        model = genai.GenerativeModel(model_name)
-        all_segments: List[dict] = []
-        offset = 0.0
-        for p in paths:
-            mime = "audio/mpeg" if p.suffix.lower() == ".mp3" else "application/octet-stream"
+        files, generative = _gemini_clients(api_key)
+        model = genai.GenerativeModel(_CONFIG.gemini_model)
+        # generate_content otherwise binds the SDK's global default client on first use
+        model._client = generative
+        return files, model
+    except Exception as e:
+        log.debug(f"[gemini] configure failed: {e}")
+        return None
+
+# Gemini's concurrency limits are per API key, so in-flight chunk calls are capped per key
+# across all requests, not per request. {(key digest, limit): [Semaphore, pipelines using it]};
+# changing GEMINI_CONCURRENCY at runtime starts a fresh semaphore. An entry lives exactly as long
+# as some pipeline holds it, so arbitrary header keys can't pile up and a semaphore with holders
+# or waiters is never dropped and replaced (which would let that key exceed its limit).
+# Only touched from the event loop thread, so no lock.
+_GEMINI_SLOTS: dict[tuple, list] = {}
+
+def _gemini_slots(api_key_override: Optional[str] = None) -> Tuple[tuple, asyncio.Semaphore]:
+    """
+    Returns (slot_key, semaphore) for the key a pipeline will use and counts it as a user.
+    Every call must be paired with _release_gemini_slots(slot_key).
+    """
+    api_key = (api_key_override or _env("GOOGLE_API_KEY")).strip()
+    limit = _CONFIG.gemini_concurrency
+    slot_key = (hashlib.blake2b(api_key.encode(), digest_size=8).digest(), limit)
+    entry = _GEMINI_SLOTS.get(slot_key)
+    if entry is None:
+        entry = _GEMINI_SLOTS[slot_key] = [asyncio.Semaphore(limit), 0]
+    entry[1] += 1
+    return slot_key, entry[0]
+
+def _release_gemini_slots(slot_key: tuple) -> None:
+    entry = _GEMINI_SLOTS[slot_key]
+    entry[1] -= 1
+    if not entry[1]:
+        del _GEMINI_SLOTS[slot_key]
+
+_CHUNK_MIME_TYPES = {
+    ".mp3": "audio/mpeg", ".ogg": "audio/ogg", ".aac": "audio/aac",
+    # Unsplit yt-dlp downloads (no ffmpeg)
+    ".webm": "audio/webm", ".m4a": "audio/mp4", ".opus": "audio/ogg",
+}
+
+def _gemini_transcribe_chunk(files, model, chunk: Union[Path, bytes], lang: str) -> str:
+    """
+    Sends one audio chunk and returns its transcript text ("" if the model returned none).
+    A file chunk goes through Gemini's file API; piped mp3 bytes are sent inline with the request.
+    Blocking (sync SDK); run it on a worker thread.
+    """
+    if isinstance(chunk, bytes):
+        audio = {"mime_type": "audio/mpeg", "data": chunk}
+    else:
+        mime = _CHUNK_MIME_TYPES.get(chunk.suffix.lower(), "application/octet-stream")
+        # Upload file to Gemini's file API
+        audio = files.create_file(path=str(chunk), mime_type=mime, display_name=chunk.name)
+    # Simple instruction to get raw transcript; model may return plain text
+    prompt = f"Transcribe this audio to {lang or 'English'} text only. Return raw transcript without extra commentary."
+    resp = model.generate_content([audio, prompt])
+    text = (resp.text or "").strip() if hasattr(resp, "text") else ""
+    if not text:
+        # Some SDK versions return candidates
+        cand_text = ""
+        try:
+            if resp.candidates and resp.candidates[0].content.parts:
+                cand_text = "".join(getattr(pt, "text", "") for pt in resp.candidates[0].content.parts)
+        except Exception:
+            pass
+        text = cand_text.strip()
+    return text
+
+async def _iter_whole_file(path: Path) -> AsyncIterator[Tuple[int, Path]]:
+    """
+    Yields the downloaded audio file as the only chunk (index 0); used when ffmpeg is missing.
+    """
+    yield 0, path
+
+async def _gemini_iter_segments(video_id: str, lang: str, api_key_override: Optional[str] = None, cleanup_dirs: Optional[set[Path]] = None) -> AsyncIterator[dict]:
+    """
+    Gemini STT pipeline as an async generator of {text,start,duration} rows, in time order.
+    Each chunk is uploaded and transcribed as soon as ffmpeg closes it, while ffmpeg keeps
+    producing the next ones, so wall time is roughly max(download + split, transcription)
+    rather than their sum, and the first row is ready after the first chunk.
+    Up to GEMINI_CONCURRENCY chunks (default 4) per API key are in flight at once, process-wide.
+    One row per chunk: chunk i starts at i * GEMINI_SEGMENT_SEC because ffmpeg cut the
+    audio on fixed time boundaries, and its duration is that nominal chunk length.
+    With GEMINI_PIPE_CHUNKS=1 the chunks are sliced from ffmpeg's stdout and sent inline
+    instead of being written to a temp dir (see _start_audio_pipe).
+    Without ffmpeg the audio is downloaded whole and sent as a single chunk at offset 0.
+    Yields nothing if the key/package/tools are missing; raises RuntimeError if the
+    download/split fails midway. Cleans up temp files when closed, unless cleanup_dirs is
+    given: then the chunk dir is added to it as soon as it exists and the caller removes it.
+    """
+    gem = _gemini_model(api_key_override)
+    if not gem:
+        return
+    files, model = gem
+    cfg = _CONFIG
+    segment_seconds = cfg.gemini_segment_sec
+    out_dir: Optional[Path] = None
+    reencode: Optional[Callable[[], subprocess.Popen]] = None
+    err_log = None
+    whole_file: Optional[Path] = None
+    if not _has_cmd("ffmpeg"):
+        # Nothing to split or stream with: transcribe the whole download as one chunk
+        log.debug("[gemini] ffmpeg not found; using single-file transcription")
+        whole_file = await _run_stt_blocking(_download_audio_tmp, video_id)
+        if not whole_file:
+            return
+        out_dir = whole_file.parent
+        if cleanup_dirs is not None:
+            cleanup_dirs.add(out_dir)
+        procs = []
+        # Length unknown without ffprobe; _normalize_durations leaves a lone 0.0 as is
+        chunk_seconds = 0.0
+    elif cfg.gemini_pipe_chunks:
+        started = await _run_stt_blocking(_start_audio_pipe, video_id)
+        if not started:
+            return
+        proc, err_log = started
+        procs = [proc]
+        chunk_frames = max(1, segment_seconds * _PIPE_SAMPLE_RATE // _MP3_FRAME_SAMPLES)
+        chunk_seconds = chunk_frames * _MP3_FRAME_SAMPLES / _PIPE_SAMPLE_RATE
+    else:
+        started = await _run_stt_blocking(_start_audio_segmenter, video_id, segment_seconds)
+        if not started:
+            return
+        out_dir, procs, reencode = started
+        if cleanup_dirs is not None:
+            cleanup_dirs.add(out_dir)
+        chunk_seconds = float(segment_seconds)
+    slot_key, sem = _gemini_slots(api_key_override)
+    tasks: List[asyncio.Task] = []
+    # Transcription tasks in chunk order; None marks the end of the audio
+    pending: asyncio.Queue = asyncio.Queue()
+
+    async def transcribe(idx: int, chunk: Union[Path, bytes]) -> Optional[str]:
+        async with sem:
             try:
-                # Upload file to Gemini's file API
-                file = genai.upload_file(path=str(p), mime_type=mime)
-                # Simple instruction to get raw transcript; model may return plain text
-                prompt = f"Transcribe this audio to {lang or 'English'} text only. Return raw transcript without extra commentary."
-                resp = model.generate_content([file, prompt])
-                text = (resp.text or "").strip() if hasattr(resp, "text") else ""
-                if not text:
-                    # Some SDK versions return candidates
-                    cand_text = ""
-                    try:
-                        if resp.candidates and resp.candidates[0].content.parts:
-                            cand_text = "".join(getattr(pt, "text", "") for pt in resp.candidates[0].content.parts)
-                    except Exception:
-                        pass
-                    text = cand_text.strip()
-                if not text:
-                    log.debug("[gemini] empty transcript text for chunk; skipping")
-                    continue
-                # We don't have token-level timestamps; emit one segment per chunk.
-                seg = {"text": text, "start": offset, "duration": 0.0}
-                all_segments.append(seg)
-                # Update offset by rough duration using ffprobe if available, else chunk length guess
-                dur = _probe_duration_seconds(p)
-                offset += dur if dur else 0.0
+                text = await _run_stt_blocking(_gemini_transcribe_chunk, files, model, chunk, lang)
             except Exception as e:
-                log.debug(f"[gemini] chunk transcription failed: {e}")
-                continue
-        return _normalize_durations(all_segments) if all_segments else None
+                log.debug(f"[gemini] chunk {idx} transcription failed: {e}")
+                return None
+        if not text:
+            log.debug(f"[gemini] empty transcript text for chunk {idx}; skipping")
+        return text
+
+    async def produce() -> None:
+        nonlocal procs, reencode
+        try:
+            while True:
+                if whole_file is not None:
+                    chunks = _iter_whole_file(whole_file)
+                elif err_log is not None:
+                    chunks = _iter_piped_chunks(procs[0], err_log, chunk_frames * _MP3_FRAME_BYTES)
+                else:
+                    chunks = _iter_finished_parts(out_dir, procs)
+                try:
+                    async for idx, chunk in chunks:
+                        task = asyncio.create_task(transcribe(idx, chunk))
+                        tasks.append(task)
+                        pending.put_nowait(task)
+                    return
+                except RuntimeError as e:
+                    # Only a stream copy that failed before producing a chunk is retried
+                    if tasks or not reencode:
+                        raise
+                    log.debug(f"[gemini] stream copy failed ({e}); re-encoding")
+                    for part in out_dir.glob("part_*"):
+                        part.unlink(missing_ok=True)
+                    procs = [await _run_stt_blocking(reencode)]
+                    reencode = None
+        finally:
+            pending.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        idx = 0
+        while (task := await pending.get()) is not None:
+            text = await task
+            if text:
+                # We don't have token-level timestamps; emit one segment per chunk.
+                yield {"text": text, "start": idx * chunk_seconds, "duration": chunk_seconds}
+            idx += 1
+        await producer  # surfaces a failed download/split
+    finally:
+        producer.cancel()
+        for t in tasks:
+            t.cancel()
+        _release_gemini_slots(slot_key)
+        _stop_processes(procs)
+        if err_log is not None:
+            err_log.close()
+        if out_dir is not None and cleanup_dirs is None:
+            _fast_rmtree(out_dir)
+
+async def _gemini_stt_fallback(video_id: str, lang: str, api_key_override: Optional[str] = None, cleanup_dirs: Optional[set[Path]] = None) -> Optional[List[dict]]:
+    """
+    Buffers the whole Gemini transcript (see _gemini_iter_segments). Returns its rows or None.
+    """
+    try:
+        segs = [row async for row in _gemini_iter_segments(video_id, lang, api_key_override, cleanup_dirs)]
     except Exception as e:
-        log.debug(f"[gemini] configure/generate failed: {e}")
+        log.debug(f"[gemini] download/split pipeline failed: {e}")
         return None
+    return segs or None
 
-def _probe_duration_seconds(path: Path) -> Optional[float]:
-    if not _has_cmd("ffprobe"):
-        return None
-    cmd = [
-        "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nokey=1:noprint_wrappers=1", str(path)
-    ]
+async def _gemini_ndjson_response(video_id: str, lang: str, disable_translate: bool, api_key_override: Optional[str] = None) -> Response:
+    """
+    Streams Gemini rows to the client as NDJSON while later chunks are still being transcribed.
+    The complete transcript is cached and the chunk dir removed once the stream has been fully sent.
+    If the pipeline fails after the first row, the stream ends with an {"error": ...} line
+    instead of more rows, so a client can tell a truncated transcript from a complete one.
+    Raises 502 if the backend produces no rows at all, 503 if audio scratch space is over quota.
+    """
+    _check_audio_quota()
+    scratch: set[Path] = set()
+    rows = _gemini_iter_segments(video_id, lang, api_key_override, scratch)
     try:
-        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True).stdout.strip()
-        return float(out)
-    except Exception:
-        return None
+        first = await anext(rows, None)
+    except Exception as e:
+        log.debug(f"[gemini] download/split pipeline failed: {e}")
+        first = None
+    if first is None:
+        await rows.aclose()
+        await _remove_dirs_now(scratch)
+        raise HTTPException(status_code=502, detail="forceSTT failed: no segments produced by backend")
+    collected: List[dict] = []
+    complete = False
+
+    async def body():
+        nonlocal complete
+        row = first
+        try:
+            while row is not None:
+                collected.append(row)
+                yield orjson.dumps(row) + b"\n"
+                row = await anext(rows, None)
+            complete = True
+        except Exception as e:
+            log.debug(f"[gemini] stream aborted: {e}")
+            yield orjson.dumps({"error": "STT pipeline failed; transcript is incomplete"}) + b"\n"
+        finally:
+            await rows.aclose()
+
+    def store() -> None:
+        # A partial transcript (client gone, pipeline failed) is not cached
+        if complete:
+            cache_set(video_id, lang, disable_translate, collected)
+
+    background = BackgroundTasks()
+    background.add_task(store)
+    for d in scratch:
+        background.add_task(_fast_rmtree, d)
+    return StreamingResponse(body(), media_type="application/x-ndjson", background=background)
+
+def _ndjson_cached_response(request: Request, body: bytes, etag: str) -> Response:
+    """
+    Re-sends a cached JSON array as NDJSON, for NDJSON requests that hit the cache.
+    Gets its own ETag since the bytes differ from the JSON representation.
+    """
+    lines = b"".join(orjson.dumps(row) + b"\n" for row in orjson.loads(body))
+    return _json_bytes_response(request, lines, etag[:-1] + '-ndjson"', "application/x-ndjson")
 
 def supports_listing() -> bool:
     """
@@ -457,6 +1160,9 @@ def supports_listing() -> bool:
         log.debug(f"[diag] supports_listing import error: {e}")
         return False
 
+# The installed library doesn't change while the process runs; check it once.
+_SUPPORTS_LISTING = supports_listing()
+
 
 def try_get_transcript_simple(video_id: str, preferred_langs: list[str]):
     """
@@ -467,12 +1173,30 @@ def try_get_transcript_simple(video_id: str, preferred_langs: list[str]):
     for langs in candidates:
         try:
             data = YouTubeTranscriptApi.get_transcript(video_id, languages=langs)
-            return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+            return _entries_to_rows(data)
         except Exception as e:
             log.debug(f"[simple] languages={langs} failed: {e}")
     return None
 
 
+class _EmptyTranscript(ValueError):
+    """fetch() returned no entries."""
+
+
+# Throttling errors raised by youtube-transcript-api (the class names differ across releases)
+_RATE_LIMIT_ERRORS: tuple = tuple(
+    getattr(youtube_transcript_api, name)
+    for name in ("TooManyRequests", "RequestBlocked", "IpBlocked")
+    if hasattr(youtube_transcript_api, name)
+)
+_TRANSIENT_ERRORS: tuple = (_EmptyTranscript, ElementTree.ParseError) + _RATE_LIMIT_ERRORS
+# Message fallback for anything else (e.g. a requests HTTPError carrying a 429)
+_TRANSIENT_RE = re.compile(r"429|too many requests|no element found|empty", re.IGNORECASE)
+
+def _is_transient(e: Exception) -> bool:
+    return isinstance(e, _TRANSIENT_ERRORS) or _TRANSIENT_RE.search(str(e)) is not None
+
+
 def fetch_with_retry(fetch_call: Callable[[], list], attempts: int = 5, base_delay: float = 1.2) -> Optional[list]:
     """
     Retries transcript_obj.fetch() to mitigate YouTube 429 / empty responses.
@@ -480,19 +1204,18 @@ def fetch_with_retry(fetch_call: Callable[[], list], attempts: int = 5, base_del
       - HTTP 429 (Too Many Requests)
       - Empty/invalid XML ('no element found' or empty data)
     Adds small jitter to reduce thundering herd.
+    Called from worker threads (see /transcript), so the backoff sleep never blocks the event loop.
     """
     for i in range(attempts):
         try:
             data = fetch_call()
             if not data:
-                raise ValueError("empty transcript data")
+                raise _EmptyTranscript("empty transcript data")
             return data
         except Exception as e:
-            msg = str(e).lower()
-            is_rate_limit = "429" in msg or "too many requests" in msg
-            is_empty_xml = "no element found" in msg or "empty transcript" in msg or "empty" in msg
-            if i < attempts - 1 and (is_rate_limit or is_empty_xml):
-                delay = base_delay * (2 ** i) + random.uniform(0.0, 0.6)
+            if i < attempts - 1 and _is_transient(e):
+                # 0-0.6 s jitter from the clock's low bits; avoids the global Random's lock
+                delay = base_delay * (1 << i) + (time.time_ns() & 0x3FF) / 1700.0
                 time.sleep(delay)
                 continue
             raise
@@ -517,282 +1240,348 @@ def fetch_transcript_segments(video_id: str, lang: str = "en", disable_translate
     preferred_langs = [lang, "en", "en-US", "en-GB"]
     log.debug(f"[fetch] video_id={video_id} lang={lang} preferred={preferred_langs} disable_translate={disable_translate}")
 
-    if not supports_listing():
+    if not _SUPPORTS_LISTING:
         return try_get_transcript_simple(video_id, preferred_langs)
 
     try:
         list_obj = YouTubeTranscriptApi.list_transcripts(video_id)
 
+        # Index the tracks once; every step below is then a dict lookup or a
+        # walk over a prefiltered list instead of another scan of list_obj.
+        transcripts = list(list_obj)
+        by_code_manual: dict = {}
+        by_code_gen: dict = {}
+        for tr in transcripts:
+            (by_code_gen if tr.is_generated else by_code_manual).setdefault(tr.language_code, tr)
+        all_translatable = [tr for tr in transcripts if tr.is_translatable]
+
         # Debug summary
-        summary = []
-        for tr in list_obj:
-            summary.append({
-                "language": tr.language,
-                "language_code": tr.language_code,
-                "generated": tr.is_generated,
-                "translatable": tr.is_translatable
-            })
+        summary = [{
+            "language": tr.language,
+            "language_code": tr.language_code,
+            "generated": tr.is_generated,
+            "translatable": tr.is_translatable
+        } for tr in transcripts]
         log.debug(f"[fetch] available_transcripts={summary}")
 
         # 1) Manual transcript in preferred languages (retry)
         for l in preferred_langs:
+            tr = by_code_manual.get(l)
+            if tr is None:
+                continue
             try:
-                tr = list_obj.find_manually_created_transcript([l])
                 log.debug(f"[fetch] selected manual transcript lang={l}")
-                data = fetch_with_retry(lambda: tr.fetch())
-                return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+                data = fetch_with_retry(tr.fetch)
+                return _entries_to_rows(data)
             except Exception as e:
                 log.debug(f"[fetch] manual lang={l} not usable: {e}")
 
         # 2) Translate manual transcript to requested lang (retry) — skip if same lang or disabled
         if not disable_translate:
-            for tr in list_obj:
+            tgt_code = (lang or "en").lower()
+            for tr in all_translatable:
                 try:
-                    if tr.is_translatable:
-                        src_code = (tr.language_code or "").lower()
-                        tgt_code = (lang or "en").lower()
-                        if src_code == tgt_code:
-                            continue
-                        t = tr.translate(lang if lang else "en")
-                        log.debug(f"[fetch] translate attempt from {tr.language_code} to lang={lang}")
+                    src_code = (tr.language_code or "").lower()
+                    if src_code == tgt_code:
+                        continue
+                    t = tr.translate(lang if lang else "en")
+                    log.debug(f"[fetch] translate attempt from {tr.language_code} to lang={lang}")
+                    try:
+                        data = fetch_with_retry(t.fetch)
+                        return _entries_to_rows(data)
+                    except Exception as e2:
+                        # Graceful degrade: return original manual transcript if available
+                        log.debug(f"[fetch] translate failed ({e2}); degrading to original {tr.language_code}")
                         try:
-                            data = fetch_with_retry(lambda: t.fetch())
-                            return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
-                        except Exception as e2:
-                            # Graceful degrade: return original manual transcript if available
-                            log.debug(f"[fetch] translate failed ({e2}); degrading to original {tr.language_code}")
-                            try:
-                                data_src = fetch_with_retry(lambda: tr.fetch())
-                                return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data_src]
-                            except Exception as e3:
-                                log.debug(f"[fetch] degrade fetch original {tr.language_code} failed: {e3}")
+                            data_src = fetch_with_retry(tr.fetch)
+                            return _entries_to_rows(data_src)
+                        except Exception as e3:
+                            log.debug(f"[fetch] degrade fetch original {tr.language_code} failed: {e3}")
                 except Exception as e:
                     log.debug(f"[fetch] translate setup failed for {tr.language_code}: {e}")
 
         # 3) Generated transcript in preferred languages (retry)
         for l in preferred_langs:
+            tr = by_code_gen.get(l)
+            if tr is None:
+                continue
             try:
-                tr = list_obj.find_generated_transcript([l])
                 log.debug(f"[fetch] selected generated transcript lang={l}")
-                data = fetch_with_retry(lambda: tr.fetch())
-                return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+                data = fetch_with_retry(tr.fetch)
+                return _entries_to_rows(data)
             except Exception as e:
                 log.debug(f"[fetch] generated lang={l} not usable: {e}")
 
         # 4) AUTO mode: any available transcript (manual > generated) (retry)
         if lang.lower() == "auto":
-            for tr in list_obj:
+            for tr in by_code_manual.values():
                 try:
-                    if not tr.is_generated:
-                        log.debug(f"[fetch] AUTO picked manual {tr.language_code}")
-                        data = fetch_with_retry(lambda: tr.fetch())
-                        return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+                    log.debug(f"[fetch] AUTO picked manual {tr.language_code}")
+                    data = fetch_with_retry(tr.fetch)
+                    return _entries_to_rows(data)
                 except Exception as e:
                     log.debug(f"[fetch] AUTO manual {tr.language_code} failed: {e}")
-            for tr in list_obj:
+            for tr in by_code_gen.values():
                 try:
-                    if tr.is_generated:
-                        log.debug(f"[fetch] AUTO picked generated {tr.language_code}")
-                        data = fetch_with_retry(lambda: tr.fetch())
-                        return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+                    log.debug(f"[fetch] AUTO picked generated {tr.language_code}")
+                    data = fetch_with_retry(tr.fetch)
+                    return _entries_to_rows(data)
                 except Exception as e:
                     log.debug(f"[fetch] AUTO generated {tr.language_code} failed: {e}")
 
         # 5) Last resort: first fetchable transcript (any language) (retry)
-        for tr in list_obj:
+        for tr in transcripts:
             try:
                 log.debug(f"[fetch] last-resort try {tr.language_code} (generated={tr.is_generated})")
-                data = fetch_with_retry(lambda: tr.fetch())
-                return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+                data = fetch_with_retry(tr.fetch)
+                return _entries_to_rows(data)
             except Exception as e:
                 log.debug(f"[fetch] last-resort {tr.language_code} failed: {e}")
 
         # 6) Final direct fallback even when listing is available
         try:
             data = YouTubeTranscriptApi.get_transcript(video_id, languages=preferred_langs)
-            return [{"text": s["text"], "start": s["start"], "duration": s["duration"]} for s in data]
+            return _entries_to_rows(data)
         except Exception as e:
             log.debug(f"[fetch] direct get_transcript fallback failed: {e}")
 
     except (TranscriptsDisabled, NoTranscriptFound) as e:
+        # Not transient: let the route cache it as a long-lived "missing" result
         log.debug(f"[fetch] no transcripts available: {e}")
+        raise
     except Exception as e:
         log.exception(f"[fetch] unexpected error: {e}")
 
     return None
 
 
+# In-flight STT runs: {(videoId, lang, disableTranslate, backend): Future of the segments}.
+# A second request for the same key awaits the first run instead of starting its own
+# download + transcription. Only touched from the event loop, so no lock.
+_INFLIGHT: dict[tuple, asyncio.Future] = {}
+
+async def _singleflight(key: tuple, run: Callable[[], Awaitable]):
+    """
+    Awaits run() once per key at a time; concurrent callers with the same key share its result.
+    If the first caller fails or is cancelled, the others get None (their own failure path).
+    """
+    fut = _INFLIGHT.get(key)
+    if fut is not None:
+        log.debug(f"[singleflight] joining in-flight run for {key}")
+        # shield: a disconnecting follower must not cancel the shared future
+        return await asyncio.shield(fut)
+    fut = _INFLIGHT[key] = asyncio.get_running_loop().create_future()
+    result = None
+    try:
+        result = await run()
+        return result
+    finally:
+        del _INFLIGHT[key]
+        fut.set_result(result)
+
+def _store_stt_result(video_id: str, lang: str, disable_translate: bool, segs: Segments) -> Tuple[bytes, str]:
+    # Requests that joined a single-flight run find the first caller's entry already stored
+    return cache_get(video_id, lang, disable_translate) or cache_set(video_id, lang, disable_translate, segs)
+
+# STT backend name -> handler(video_id, lang, gem_override, cleanup_dirs) -> segments or None.
+# Each handler owns its temp files (see cleanup_dirs). "local" is not implemented yet.
+_STT_BACKENDS: dict[str, Callable[[str, str, Optional[str], set[Path]], Awaitable[Optional[Segments]]]] = {
+    "gemini": _gemini_stt_fallback,
+    "openai": lambda video_id, lang, _gem_override, cleanup_dirs: _stt_fallback(video_id, lang, cleanup_dirs),
+}
+
+async def _run_stt_fallback(video_id: str, lang: str, disable_translate: bool, backend: str, gem_override: Optional[str], cleanup_dirs: set[Path], path_tag: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Runs the selected STT backend (coalesced per key, see _singleflight) and caches a successful result.
+    Returns (json_bytes, etag), or None if the backend is unavailable or produced nothing.
+    Raises 503 when audio scratch space is over AUDIO_DISK_QUOTA_MB.
+    path_tag only labels the logs (forceSTT / exception path / no-data path).
+    """
+    handler = _STT_BACKENDS.get(backend)
+    if handler is None:
+        log.debug(f"[route] STT_BACKEND='{backend}' not implemented, skipping [{path_tag}]")
+        return None
+    key = (video_id, lang, disable_translate, backend)
+    if key not in _INFLIGHT:
+        _check_audio_quota()  # joining a run in flight needs no new scratch space
+    log.debug(f"[route] STT via {backend} [{path_tag}]")
+    segs = await _singleflight(key, lambda: handler(video_id, lang, gem_override, cleanup_dirs))
+    if not segs:
+        return None
+    return _store_stt_result(video_id, lang, disable_translate, segs)
+
+
 # ---------------------------------------
 # Routes
 # ---------------------------------------
 
-@app.get("/transcript")
-def transcript(request: Request, videoId: str, lang: str = "en", disableTranslate: bool = False, sttFallback: bool = True, sttBackend: Optional[str] = None, forceSTT: bool = False):
+@app.get("/transcript", response_model=None, response_class=ORJSONResponse)
+async def transcript(request: Request, background_tasks: BackgroundTasks, videoId: str, lang: str = "en", disableTranslate: bool = False, sttFallback: bool = True, sttBackend: Optional[str] = None, forceSTT: bool = False):
     """
     Returns a list of segments: [{text, start, duration}, ...]
     If disableTranslate=true, translation is skipped and the best available manual/generated track is returned.
+    With forceSTT and the Gemini backend, "Accept: application/x-ndjson" streams one segment per line as chunks finish
+    (cache hits are sent as NDJSON too); a stream that fails midway ends with an {"error": ...} line.
     """
+    # STT scratch dirs are removed after the response has been sent, not before
+    cleanup_dirs: set[Path] = set()
+    try:
+        response = await _transcript_response(request, videoId, lang, disableTranslate, sttFallback, sttBackend, forceSTT, cleanup_dirs)
+    except BaseException:
+        await _remove_dirs_now(cleanup_dirs)
+        raise
+    for d in cleanup_dirs:
+        background_tasks.add_task(_fast_rmtree, d)
+    return response
+
+async def _transcript_response(request: Request, videoId: str, lang: str, disableTranslate: bool, sttFallback: bool, sttBackend: Optional[str], forceSTT: bool, cleanup_dirs: set[Path]) -> Response:
     log.info(f"GET /transcript videoId={videoId} lang={lang} disableTranslate={disableTranslate} client={request.client.host}")
     # Optional Gemini API key override via header
     gem_header = request.headers.get("X-Gemini-Api-Key", "").strip()
     gem_override = gem_header if gem_header else None
+    enable_env = _CONFIG.enable_stt
+    backend = sttBackend.strip().lower() if sttBackend else _CONFIG.stt_backend
+    # Decided up front so an unusable backend never enters the fallback paths below
+    backend_ok = backend in _STT_BACKENDS
+    stt_allowed = sttFallback and enable_env and backend_ok
+    wants_ndjson = forceSTT and backend == "gemini" and "application/x-ndjson" in request.headers.get("Accept", "")
     # 1) Cache check
-    data = cache_get(videoId, lang, disableTranslate)
-    if data:
+    cached = cache_get(videoId, lang, disableTranslate)
+    if cached:
         log.debug("[cache] hit")
-        return data
+        if wants_ndjson:
+            # Same format as the first, streamed response, so line-by-line clients keep working
+            return _ndjson_cached_response(request, *cached)
+        return _json_bytes_response(request, *cached)
 
     # 1b) Failure (circuit breaker) check
-    remaining = fail_cache_get(videoId, lang, disableTranslate)
-    if remaining:
-        log.debug(f"[fail-cache] hit, remaining={remaining}s")
-        headers = {"Retry-After": str(remaining)}
-        raise HTTPException(status_code=429, detail="Upstream rate limited recently. Please retry later.", headers=headers)
+    captions_missing = False
+    failed = fail_cache_get(videoId, lang, disableTranslate)
+    if failed:
+        remaining, reason = failed
+        log.debug(f"[fail-cache] hit, reason={reason} remaining={remaining}s")
+        if reason == "missing" and stt_allowed:
+            # Known to have no captions, but this request may use STT: skip straight to it
+            captions_missing = True
+        elif reason == "missing":
+            raise HTTPException(status_code=404, detail="No captions available for this video")
+        else:
+            headers = {"Retry-After": str(remaining)}
+            raise HTTPException(status_code=429, detail="Upstream rate limited recently. Please retry later.", headers=headers)
 
     # 2) Optional: force STT path for testing or explicit bypass of YouTube
     if forceSTT:
-        enable_env = os.getenv("ENABLE_STT", "1").strip() != "0"
-        backend = (sttBackend or os.getenv("STT_BACKEND", "openai")).strip().lower()
         log.debug(f"[route] forceSTT=True, STT enabled={enable_env} backend='{backend}'")
         if not enable_env:
             raise HTTPException(status_code=400, detail="STT is disabled by ENABLE_STT=0")
-        segs: Optional[List[dict]] = None
-        if backend == "gemini":
-            log.debug("[route] forceSTT -> Gemini (chunked)")
-            audio = _download_audio_tmp(videoId)
-            if audio:
-                try:
-                    parts = _split_audio_ffmpeg(audio, segment_seconds=int(os.getenv("GEMINI_SEGMENT_SEC", "300")))
-                    segs = _gemini_transcribe_files(parts, lang, api_key_override=gem_override)
-                finally:
-                    try:
-                        shutil.rmtree(audio.parent, ignore_errors=True)
-                        if 'parts' in locals() and parts and parts[0].parent != audio.parent:
-                            shutil.rmtree(parts[0].parent, ignore_errors=True)
-                    except Exception:
-                        pass
-        elif backend == "openai":
-            log.debug("[route] forceSTT -> Whisper API")
-            segs = _stt_fallback(videoId, lang)
-        elif backend == "local":
-            log.debug("[route] forceSTT -> local backend not implemented yet")
-        else:
-            log.debug(f"[route] forceSTT -> unknown STT_BACKEND='{backend}'")
-        if segs:
-            cache_set(videoId, lang, disableTranslate, segs)
-            return segs
+        if wants_ndjson:
+            log.debug("[route] forceSTT -> Gemini (chunked, streamed as NDJSON)")
+            return await _gemini_ndjson_response(videoId, lang, disableTranslate, gem_override)
+        stored = await _run_stt_fallback(videoId, lang, disableTranslate, backend, gem_override, cleanup_dirs, "forceSTT")
+        if stored:
+            return _json_bytes_response(request, *stored)
         raise HTTPException(status_code=502, detail="forceSTT failed: no segments produced by backend")
 
     # 3) Upstream fetch (YouTube captions)
+    data: Optional[List[dict]] = None
     try:
-        data = fetch_transcript_segments(videoId, lang, disable_translate=disableTranslate)
+        if not captions_missing:
+            data = await run_in_threadpool(fetch_transcript_segments, videoId, lang, disableTranslate)
+    except (TranscriptsDisabled, NoTranscriptFound) as e:
+        log.debug(f"[route] no captions for video: {e}")
+        captions_missing = True
     except Exception as e:
         # For upstream exceptions (often 429), try STT fallback before failing
         log.debug(f"[route] upstream exception: {e}")
-        enable_env = os.getenv("ENABLE_STT", "1").strip() != "0"
-        backend = (sttBackend or os.getenv("STT_BACKEND", "openai")).strip().lower()
         log.debug(f"[route] STT enabled={enable_env} backend='{backend}' (exception path)")
-        if sttFallback and enable_env:
-            segs: Optional[List[dict]] = None
-            if backend == "gemini":
-                log.debug("[route] attempting STT fallback via Gemini (chunked) [exception path]")
-                audio = _download_audio_tmp(videoId)
-                if audio:
-                    try:
-                        parts = _split_audio_ffmpeg(audio, segment_seconds=int(os.getenv("GEMINI_SEGMENT_SEC", "300")))
-                        segs = _gemini_transcribe_files(parts, lang, api_key_override=gem_override)
-                    finally:
-                        try:
-                            shutil.rmtree(audio.parent, ignore_errors=True)
-                            if 'parts' in locals() and parts and parts[0].parent != audio.parent:
-                                shutil.rmtree(parts[0].parent, ignore_errors=True)
-                        except Exception:
-                            pass
-            elif backend == "openai":
-                log.debug("[route] attempting STT fallback via Whisper API [exception path]")
-                segs = _stt_fallback(videoId, lang)
-            elif backend == "local":
-                log.debug("[route] local STT backend not implemented yet [exception path]")
-            else:
-                log.debug(f"[route] unknown STT_BACKEND='{backend}', skipping [exception path]")
-            if segs:
-                cache_set(videoId, lang, disableTranslate, segs)
-                return segs
+        if stt_allowed:
+            stored = await _run_stt_fallback(videoId, lang, disableTranslate, backend, gem_override, cleanup_dirs, "exception path")
+            if stored:
+                return _json_bytes_response(request, *stored)
+        elif sttFallback and enable_env:
+            log.info(f"[route] STT backend '{backend}' not available; skipping STT fallback (exception path)")
         # If we reach here, STT was disabled or failed. Apply cooldown and return 429
-        fail_cache_set(videoId, lang, disableTranslate, retry_after_seconds=120)
-        headers = {"Retry-After": "120"}
-        raise HTTPException(status_code=429, detail="Upstream error. Please retry later.", headers=headers)
+        raise HTTPException(status_code=429, detail="Upstream error. Please retry later.",
+                            headers=fail_cache_set(videoId, lang, disableTranslate, "throttled"))
     if not data:
         # 2b) Optional STT fallback (backend selection)
-        enable_env = os.getenv("ENABLE_STT", "1").strip() != "0"
-        backend = (sttBackend or os.getenv("STT_BACKEND", "openai")).strip().lower()
         log.debug(f"[route] STT enabled={enable_env} backend='{backend}' (no-data path)")
-        if sttFallback and enable_env:
-            segs: Optional[List[dict]] = None
-            if backend == "gemini":
-                log.debug("[route] attempting STT fallback via Gemini (chunked)")
-                audio = _download_audio_tmp(videoId)
-                if audio:
-                    try:
-                        parts = _split_audio_ffmpeg(audio, segment_seconds=int(os.getenv("GEMINI_SEGMENT_SEC", "300")))
-                        segs = _gemini_transcribe_files(parts, lang, api_key_override=gem_override)
-                    finally:
-                        try:
-                            # Clean both original and parts' parent if different
-                            shutil.rmtree(audio.parent, ignore_errors=True)
-                            if parts and parts[0].parent != audio.parent:
-                                shutil.rmtree(parts[0].parent, ignore_errors=True)
-                        except Exception:
-                            pass
-            elif backend == "openai":
-                log.debug("[route] attempting STT fallback via Whisper API")
-                segs = _stt_fallback(videoId, lang)
-            elif backend == "local":
-                log.debug("[route] local STT backend not implemented yet")
-            else:
-                log.debug(f"[route] unknown STT_BACKEND='{backend}', skipping")
-            if segs:
-                cache_set(videoId, lang, disableTranslate, segs)
-                return segs
-        # No data (likely 429 or no track available), add cooldown.
-        fail_cache_set(videoId, lang, disableTranslate, retry_after_seconds=300)
-        headers = {"Retry-After": "300"}
+        if stt_allowed:
+            stored = await _run_stt_fallback(videoId, lang, disableTranslate, backend, gem_override, cleanup_dirs, "no-data path")
+            if stored:
+                return _json_bytes_response(request, *stored)
+        elif sttFallback and enable_env:
+            log.info(f"[route] STT backend '{backend}' not available; skipping STT fallback (no-data path)")
+        # No data (likely 429 or no track available), add cooldown. A video without any
+        # captions gets the long "missing" cooldown unless STT was tried and failed.
+        reason = "missing" if captions_missing and not stt_allowed else "stt_failed"
+        headers = fail_cache_set(videoId, lang, disableTranslate, reason)
+        if reason == "missing":
+            # Not a throttle: retrying won't help, so no 429/Retry-After
+            raise HTTPException(status_code=404, detail="No captions available for this video")
         raise HTTPException(
             status_code=429,
             detail="Transcript temporarily unavailable (throttled or no captions). STT fallback may be disabled or unavailable.",
             headers=headers
         )
     # 3) Cache store
-    cache_set(videoId, lang, disableTranslate, data)
-    return data
+    return _json_bytes_response(request, *cache_set(videoId, lang, disableTranslate, data))
+
+
+# Exception types whose traceback was logged in the last minute: a repeating failure (bots,
+# probes) gets one full traceback per type per minute and one-line warnings in between.
+_TRACEBACK_LOGGED: TTLCache = TTLCache(maxsize=128, ttl=60)
 
+def _log_unexpected(msg: str, e: Exception) -> None:
+    if type(e) in _TRACEBACK_LOGGED:
+        log.warning(f"{msg} ({type(e).__name__}): {e}")
+        return
+    _TRACEBACK_LOGGED[type(e)] = True
+    log.exception(f"{msg}: {e}")
 
-@app.get("/transcript/languages")
-def transcript_languages(request: Request, videoId: str):
+
+def _store_langs(video_id: str, langs: list) -> Response:
+    body = orjson.dumps(langs)
+    with _CACHE_LOCK:
+        _LANGS_CACHE[video_id] = (body, LANGS_TTL_SECONDS if langs else LANGS_EMPTY_TTL_SECONDS)
+    return Response(content=body, media_type="application/json")
+
+@app.get("/transcript/languages", response_model=None)
+async def transcript_languages(request: Request, videoId: str):
     """
     Lists available transcripts (language, code, generated, translatable).
+    Results are cached per videoId (see _LANGS_CACHE).
     """
     log.info(f"GET /transcript/languages videoId={videoId} client={request.client.host}")
-    if not supports_listing():
+    if not _SUPPORTS_LISTING:
         return {"error": "Installed youtube-transcript-api does not support list_transcripts. "
                          "Use /transcript?videoId=...&lang=en or upgrade the package."}
+    with _CACHE_LOCK:
+        cached = _LANGS_CACHE.get(videoId)
+    if cached:
+        log.debug("[langs] cache hit")
+        return Response(content=cached[0], media_type="application/json")
     try:
-        list_obj = YouTubeTranscriptApi.list_transcripts(videoId)
-        langs = []
-        for tr in list_obj:
-            entry = {
-                "language": tr.language,
-                "language_code": tr.language_code,
-                "generated": tr.is_generated,
-                "translatable": tr.is_translatable
-            }
-            langs.append(entry)
-            log.debug(f"[langs] {entry}")
-        log.debug(f"[langs] total={len(langs)}")
-        return langs
+        list_obj = await run_in_threadpool(YouTubeTranscriptApi.list_transcripts, videoId)
+        langs = [{
+            "language": tr.language,
+            "language_code": tr.language_code,
+            "generated": tr.is_generated,
+            "translatable": tr.is_translatable
+        } for tr in list_obj]
+        if log.isEnabledFor(logging.DEBUG):
+            for entry in langs:
+                log.debug(f"[langs] {entry}")
+            log.debug(f"[langs] total={len(langs)}")
+        return _store_langs(videoId, langs)
     except (TranscriptsDisabled, NoTranscriptFound) as e:
         log.debug(f"[langs] none available: {e}")
-        return []
+        return _store_langs(videoId, [])
+    except (CouldNotRetrieveTranscript, OSError) as e:
+        # Expected upstream failures (YouTube refusing/blocking, HTTP errors, timeouts;
+        # requests' exceptions are OSErrors): one line, no traceback
+        log.warning(f"[langs] upstream error ({type(e).__name__}): {e}")
+        return {"error": str(e)}
     except Exception as e:
-        log.exception(f"[langs] unexpected error: {e}")
+        _log_unexpected("[langs] unexpected error", e)
         return {"error": str(e)}